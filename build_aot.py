@@ -0,0 +1,24 @@
+"""
+Ahead-of-time build of the numeric kernels in qkd_kernels.py.
+
+Running `python build_aot.py` compiles the kernels into a qkd_native
+extension module next to the sources. Short-lived invocations (CLI
+runs, test harnesses) then load a normal C extension instead of paying
+numba's first-call JIT compilation lag; qkd_kernels falls back to
+@njit automatically when the extension is absent.
+"""
+
+from numba.pycc import CC
+
+import qkd_kernels
+
+cc = CC("qkd_native")
+
+cc.export("total_error", "f8(f8[:])")(qkd_kernels._total_error_impl)
+cc.export("run_kernel", "Tuple((i8, f8, f8))(f8, f8, f8, f8, f8, f8, i8)")(
+    qkd_kernels._run_kernel_impl
+)
+
+
+if __name__ == "__main__":
+    cc.compile()
@@ -1,43 +1,247 @@
+import hashlib
 import math
+import os
+import pickle
+
+import numpy as np
+
+from qkd_kernels import run_kernel, run_sweep_kernel
+
+
+def _log_survival_term(err_rate):
+    """
+    Log-survival contribution of one error source. A certain-loss source
+    (rate >= 1) saturates to -inf, where math.log1p would raise.
+    """
+    if err_rate >= 1.0:
+        return -math.inf
+    return math.log1p(-err_rate)
 
 
 class Simulator:
-    def __init__(self, endpoints, length, len_err, fiber_speed, testing_mode=False):
+    __slots__ = (
+        "endpoints",
+        "length",
+        "len_err",
+        "fiber_speed",
+        "testing_mode",
+        "cache_dir",
+        "_run_cache",
+        "_err_names",
+        "_err_rates",
+        "_n_err",
+        "_base_log_survival",
+        "_add_log_survival",
+        "_cached_total_error",
+        "_cached_total_testing",
+        "_prop_delay",
+        "_per_qubit_time",
+    )
+
+    def __init__(
+        self, endpoints, length, len_err, fiber_speed, testing_mode=False, cache_dir=None
+    ):
         self.endpoints = endpoints
         self.length = length
         self.len_err = len_err
         self.fiber_speed = fiber_speed
         self.testing_mode = testing_mode
-        self.base_error_sources = {"fiber_length": 1 - math.exp(-len_err * length)}
-        self.additional_error_sources = {}
+        self.cache_dir = cache_dir
+        self._run_cache = {}
+        self._err_names = []
+        self._err_rates = np.empty(16, dtype=np.float64)
+        self._n_err = 0
+        self._base_log_survival = -len_err * length
+        self._add_log_survival = 0.0
+        self._cached_total_error = None
+        self._cached_total_testing = None
+        self._prop_delay = length / fiber_speed
+        self._per_qubit_time = None
+
+    def set_length(self, length):
+        """
+        Changes the fiber length and refreshes everything derived from it.
+        """
+        self.length = length
+        self._base_log_survival = -self.len_err * length
+        self._prop_delay = length / self.fiber_speed
+        self._cached_total_error = None
+        self._per_qubit_time = None
+
+    def set_fiber_speed(self, fiber_speed):
+        """
+        Changes the propagation speed and refreshes everything derived from it.
+        """
+        self.fiber_speed = fiber_speed
+        self._prop_delay = self.length / fiber_speed
+        self._per_qubit_time = None
+
+    def _get_per_qubit_time(self):
+        if self._per_qubit_time is None:
+            sender, receiver = self.endpoints
+            self._per_qubit_time = (
+                sender.fixed_delay
+                + sender._send_per_qubit
+                + receiver._recv_per_qubit
+                + 2 * self._prop_delay
+            )
+        return self._per_qubit_time
 
     def add_err_source(self, name, err_rate):
-        self.additional_error_sources[name] = err_rate
+        if name in self._err_names:
+            # re-adding a name replaces its rate, as the dict storage used
+            # to; the running sum cannot express that, so rebuild it
+            self._err_rates[self._err_names.index(name)] = err_rate
+            self._add_log_survival = sum(
+                _log_survival_term(rate)
+                for rate in self._err_rates[: self._n_err].tolist()
+            )
+        else:
+            if self._n_err == self._err_rates.shape[0]:
+                self._err_rates = np.resize(self._err_rates, 2 * self._n_err)
+            self._err_rates[self._n_err] = err_rate
+            self._err_names.append(name)
+            self._n_err += 1
+            self._add_log_survival += _log_survival_term(err_rate)
+        self._cached_total_error = None
 
     def get_total_error(self):
-        error_sources = self.base_error_sources.copy()
-        if self.testing_mode:
-            error_sources.update(self.additional_error_sources)
-
-        total_success = 1.0
-        for err in error_sources.values():
-            total_success *= 1 - err
-        return 1 - total_success
+        if (
+            self._cached_total_error is None
+            or self._cached_total_testing != self.testing_mode
+        ):
+            self._cached_total_error = -math.expm1(self._log_survival())
+            self._cached_total_testing = self.testing_mode
+        return self._cached_total_error
 
     def change_endpoints(self, new_endpoints):
         self.endpoints = new_endpoints
+        self._per_qubit_time = None
+
+    def _config_key(self, key_len):
+        """
+        Hashable fingerprint of everything run's result depends on.
+        """
+        sender, receiver = self.endpoints
+        return (
+            self.length,
+            self.len_err,
+            self.fiber_speed,
+            self.testing_mode,
+            tuple(self._err_names),
+            tuple(self._err_rates[: self._n_err].tolist()),
+            (
+                sender.transmission_delay_per_qubit,
+                sender.processing_delay_per_qubit,
+                sender.fixed_delay,
+            ),
+            (
+                receiver.transmission_delay_per_qubit,
+                receiver.processing_delay_per_qubit,
+                receiver.fixed_delay,
+            ),
+            key_len,
+        )
+
+    def _cache_path(self, key):
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.pkl")
+
+    def _load_cached_run(self, key):
+        try:
+            with open(self._cache_path(key), "rb") as cache_file:
+                result = pickle.load(cache_file)
+        except (OSError, EOFError, pickle.PickleError):
+            return None
+        self._run_cache[key] = result
+        return result
+
+    def _store_cached_run(self, key, result):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(self._cache_path(key), "wb") as cache_file:
+            pickle.dump(result, cache_file)
+
+    def _log_survival(self):
+        log_survival = self._base_log_survival
+        if self.testing_mode:
+            log_survival += self._add_log_survival
+        return log_survival
 
     def run(self, key_len):
-        total_error = self.get_total_error()
-        survival_prob = 1 - total_error
-        T = math.ceil(key_len / survival_prob)
+        key = self._config_key(key_len)
+        result = self._run_cache.get(key)
+        if result is None and self.cache_dir is not None:
+            result = self._load_cached_run(key)
+        if result is None:
+            sender, receiver = self.endpoints
+            T, total_time, total_error = run_kernel(
+                self._log_survival(),
+                self.length,
+                self.fiber_speed,
+                sender.fixed_delay,
+                sender._send_per_qubit,
+                receiver._recv_per_qubit,
+                key_len,
+            )
+
+            result = {
+                "qubits_needed": T,
+                "total_time_seconds": total_time,
+                "qubit_loss_rate": total_error,
+            }
+            self._run_cache[key] = result
+            if self.cache_dir is not None:
+                self._store_cached_run(key, result)
+        return dict(result)
+
+    def run_batch(self, key_lens, lengths=None, len_errs=None):
+        """
+        Vectorized version of run for parameter sweeps.
+
+        Accepts NumPy arrays (or scalars) for the swept parameters and
+        evaluates every configuration in one pass of NumPy ufuncs instead
+        of one Python-level run call per configuration.
+
+        Args:
+            key_lens: target key length(s)
+            lengths: fiber length(s) in meters, defaults to self.length
+            len_errs: per-meter error rate(s), defaults to self.len_err
+
+        Returns:
+            Dict of arrays: qubits_needed, total_time_seconds, qubit_loss_rate.
+            Configurations with zero survival probability (e.g. a
+            certain-loss source) can never produce a key and are reported
+            as qubits_needed -1, an infinite time, and loss rate 1.0.
+        """
+        if lengths is None:
+            lengths = self.length
+        if len_errs is None:
+            len_errs = self.len_err
+
+        key_lens, lengths, len_errs = np.broadcast_arrays(
+            np.atleast_1d(key_lens), np.atleast_1d(lengths), np.atleast_1d(len_errs)
+        )
+
+        log_survival = -len_errs * lengths
+        if self.testing_mode and self._n_err:
+            log_survival = log_survival + self._add_log_survival
+        survival_prob = np.exp(log_survival)
+
+        total_error = 1 - survival_prob
+
+        # zero survival would wrap the int64 cast to garbage; mask those
+        # entries out of the division and report the documented sentinel
+        dead = survival_prob == 0.0
+        T = np.ceil(key_lens / np.where(dead, 1.0, survival_prob)).astype(np.int64)
 
         sender, receiver = self.endpoints
-        send_time = sender.calc_total_send_delay(T)
-        recv_time = receiver.calc_total_receive_delay(T)
-        prop_delay = self.length / self.fiber_speed
+        send_time = sender.fixed_delay + T * sender._send_per_qubit
+        recv_time = T * receiver._recv_per_qubit
+        prop_delay = lengths / self.fiber_speed
 
         total_time = send_time + recv_time + 2 * prop_delay
+        T = np.where(dead, -1, T)
+        total_time = np.where(dead, np.inf, total_time)
 
         return {
             "qubits_needed": T,
@@ -45,21 +249,60 @@ class Simulator:
             "qubit_loss_rate": total_error,
         }
 
+    def run_sweep(self, key_lens, lengths=None, len_errs=None):
+        """
+        Parallel variant of run_batch: the same dict of result arrays, but
+        computed by the compiled sweep kernel with the configuration loop
+        spread across CPU threads. Worthwhile once sweeps reach tens of
+        thousands of configurations; below that run_batch's single NumPy
+        pass is usually quicker. Zero-survival configurations get the
+        same sentinel as run_batch.
+        """
+        if lengths is None:
+            lengths = self.length
+        if len_errs is None:
+            len_errs = self.len_err
+
+        key_lens, lengths, len_errs = np.broadcast_arrays(
+            np.atleast_1d(key_lens), np.atleast_1d(lengths), np.atleast_1d(len_errs)
+        )
+        key_lens = np.ascontiguousarray(key_lens, dtype=np.int64)
+        lengths = np.ascontiguousarray(lengths, dtype=np.float64)
+        len_errs = np.ascontiguousarray(len_errs, dtype=np.float64)
+
+        n_configs = lengths.shape[0]
+        out_qubits = np.empty(n_configs, dtype=np.int64)
+        out_time = np.empty(n_configs, dtype=np.float64)
+        out_loss = np.empty(n_configs, dtype=np.float64)
+
+        add_log_survival = self._add_log_survival if self.testing_mode else 0.0
+        sender, receiver = self.endpoints
+        run_sweep_kernel(
+            add_log_survival,
+            lengths,
+            len_errs,
+            self.fiber_speed,
+            sender.fixed_delay,
+            sender._send_per_qubit,
+            receiver._recv_per_qubit,
+            key_lens,
+            out_qubits,
+            out_time,
+            out_loss,
+        )
+
+        return {
+            "qubits_needed": out_qubits,
+            "total_time_seconds": out_time,
+            "qubit_loss_rate": out_loss,
+        }
+
     def run_for(self, key_len, time):
         total_error = self.get_total_error()
         survival_prob = 1 - total_error
         T = math.ceil(key_len / survival_prob)
 
-        sender, receiver = self.endpoints
-        prop_delay = self.length / self.fiber_speed
-
-        per_qubit_time = (
-            sender.calc_total_send_delay(1)
-            + receiver.calc_total_receive_delay(1)
-            + 2 * prop_delay
-        )
-
-        max_qubits = int(time // per_qubit_time)
+        max_qubits = int(time // self._get_per_qubit_time())
         expected_key_length = int(max_qubits * survival_prob)
 
         return {
@@ -74,16 +317,16 @@ class Simulator:
         Estimate the time required to generate a key of the specified length,
         including all delays and error rates.
         """
-        total_error = self.get_total_error()
-        survival_prob = 1 - total_error
-        T = math.ceil(key_len / survival_prob)
-
         sender, receiver = self.endpoints
-        send_time = sender.calc_total_send_delay(T)
-        recv_time = receiver.calc_total_receive_delay(T)
-        prop_delay = self.length / self.fiber_speed
-
-        total_time = send_time + recv_time + 2 * prop_delay
+        T, total_time, total_error = run_kernel(
+            self._log_survival(),
+            self.length,
+            self.fiber_speed,
+            sender.fixed_delay,
+            sender._send_per_qubit,
+            receiver._recv_per_qubit,
+            key_len,
+        )
 
         return {
             "total_time_seconds": total_time,
@@ -97,19 +340,15 @@ class Simulator:
         T = math.ceil(key_len / survival_prob)
 
         sender, receiver = self.endpoints
-        prop_delay = self.length / self.fiber_speed
 
         send_delay = sender.calc_total_send_delay(T)
         recv_delay = receiver.calc_total_receive_delay(T)
-        total_time = send_delay + recv_delay + 2 * prop_delay
+        total_time = send_delay + recv_delay + 2 * self._prop_delay
 
-        # For fixed time diagnostics
-        per_qubit_time = (
-            sender.calc_total_send_delay(1)
-            + receiver.calc_total_receive_delay(1)
-            + 2 * prop_delay
-        )
-        qubits_possible = int(fixed_time // per_qubit_time)
+        # For fixed time diagnostics; both delays are affine in T, so the
+        # per-qubit time comes from the cached coefficients instead of a
+        # second round of endpoint calls with T=1
+        qubits_possible = int(fixed_time // self._get_per_qubit_time())
         expected_key_generated = int(qubits_possible * survival_prob)
 
         return {
@@ -124,6 +363,14 @@ class Simulator:
 
 
 class Endpoint:
+    __slots__ = (
+        "transmission_delay_per_qubit",
+        "processing_delay_per_qubit",
+        "fixed_delay",
+        "_send_per_qubit",
+        "_recv_per_qubit",
+    )
+
     def __init__(
         self,
         transmission_delay_per_qubit=0.0,
@@ -135,32 +382,29 @@ class Endpoint:
         - transmission_delay_per_qubit (float): Delay (seconds) to transmit each qubit
         - processing_delay_per_qubit (float): Delay (seconds) to process each qubit
         - fixed_delay (float): Fixed overhead delay (seconds) per operation (send or receive)
+
+        The delay parameters are treated as fixed after construction;
+        build a new Endpoint to model different hardware.
         """
         self.transmission_delay_per_qubit = transmission_delay_per_qubit
         self.processing_delay_per_qubit = processing_delay_per_qubit
         self.fixed_delay = fixed_delay
+        self._send_per_qubit = transmission_delay_per_qubit + processing_delay_per_qubit
+        self._recv_per_qubit = (
+            fixed_delay + transmission_delay_per_qubit + processing_delay_per_qubit
+        )
 
     def calc_total_send_delay(self, T):
         """
         Total delay to send T qubits, based on fixed + transmission + processing delays.
         """
-        total_delay = (
-            self.fixed_delay
-            + T * self.transmission_delay_per_qubit
-            + T * self.processing_delay_per_qubit
-        )
-        return total_delay
+        return self.fixed_delay + T * self._send_per_qubit
 
     def calc_total_receive_delay(self, T):
         """
         Total delay to receive T qubits, based on fixed + transmission + processing delays.
         """
-        total_delay = T * (
-            self.fixed_delay
-            + self.transmission_delay_per_qubit
-            + self.processing_delay_per_qubit
-        )
-        return total_delay
+        return T * self._recv_per_qubit
 
 
 # Testing
@@ -195,6 +439,44 @@ def test_simulator_basic_run():
     print(f"Qubit loss rate: {result['qubit_loss_rate']:.4%}")
 
 
+def test_simulator_run_batch():
+    print("\n=== Testing Simulator.run_batch ===")
+    sender = Endpoint(10e-6, 20e-6, 5e-6)
+    receiver = Endpoint(10e-6, 20e-6, 5e-6)
+
+    sim = Simulator([sender, receiver], length=1000, len_err=0.00001, fiber_speed=2e8)
+
+    lengths = np.array([1000.0, 5000.0, 10000.0])
+    results = sim.run_batch(key_lens=100, lengths=lengths)
+
+    for i, length in enumerate(lengths):
+        print(
+            f"Length {length:.0f} m: "
+            f"qubits needed {results['qubits_needed'][i]}, "
+            f"time {results['total_time_seconds'][i]:.8f} s, "
+            f"loss rate {results['qubit_loss_rate'][i]:.4%}"
+        )
+
+
+def test_simulator_run_sweep():
+    print("\n=== Testing Simulator.run_sweep ===")
+    sender = Endpoint(10e-6, 20e-6, 5e-6)
+    receiver = Endpoint(10e-6, 20e-6, 5e-6)
+
+    sim = Simulator([sender, receiver], length=1000, len_err=0.00001, fiber_speed=2e8)
+
+    lengths = np.array([1000.0, 5000.0, 10000.0])
+    batch = sim.run_batch(key_lens=100, lengths=lengths)
+    sweep = sim.run_sweep(key_lens=100, lengths=lengths)
+
+    agrees = bool(
+        np.array_equal(batch["qubits_needed"], sweep["qubits_needed"])
+        and np.allclose(batch["total_time_seconds"], sweep["total_time_seconds"])
+        and np.allclose(batch["qubit_loss_rate"], sweep["qubit_loss_rate"])
+    )
+    print(f"Matches run_batch: {agrees}")
+
+
 def test_simulator_run_for():
     print("\n=== Testing Simulator.run_for ===")
     sender = Endpoint(10e-6, 20e-6, 5e-6)
@@ -293,6 +575,8 @@ def test_simulator_testing():
 if __name__ == "__main__":
     test_endpoint()
     test_simulator_basic_run()
+    test_simulator_run_batch()
+    test_simulator_run_sweep()
     test_simulator_run_for()
     test_simulator_estimate_time()
     test_change_endpoints()
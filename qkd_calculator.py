@@ -1,11 +1,27 @@
 import math
+from functools import lru_cache
+
+import numpy as np
+
+from qkd_kernels import NUMBA_AVAILABLE, njit, qkd_jittable, total_error
 
 
 class ErrorCalculator:
+    # Compiled specializations of @qkd_jittable error functions, shared
+    # across instances
+    _jit_cache = {}
+
     def __init__(self, length):
         self.length = length
-        self.err = {}
         self.err_num = 0
+        self._rates = np.empty(16, dtype=np.float64)
+        self._names = []
+        self._name_to_idx = {}
+        self._n = 0
+        self._dirty = False
+        self._cached_total = 0.0
+        self._success = 1.0
+        self._inv_success = 1.0
 
     def add_error_source(self, rate, name=None):
         """
@@ -16,14 +32,70 @@ class ErrorCalculator:
             rate (double): rate that an error occurs
             name (str): (Optional) if string to have the error stored as
         """
-        if name:
-            self.err[name] = rate
-        else:
-            err_name = f"err_source{self.err_num}"
-            self.err[err_name] = rate
+        if not name:
+            name = f"err_source{self.err_num}"
             self.err_num += 1
+        idx = self._name_to_idx.get(name)
+        if idx is not None:
+            # re-registering a name replaces its rate, as the dict
+            # storage used to
+            self._rates[idx] = rate
+            self._dirty = True
+            return
+        if self._n == self._rates.shape[0]:
+            self._rates = np.resize(self._rates, 2 * self._n)
+        self._rates[self._n] = rate
+        self._names.append(name)
+        self._name_to_idx[name] = self._n
+        self._n += 1
+        self._dirty = True
 
-    def add_length_dependent_error(self, err_rate_per_meter, name=None, length=None):
+    def add_error_sources(self, rates, names=None):
+        """
+        Batch form of add_error_source: appends a whole array of rates in
+        one shot instead of one interpreter-level call per source.
+
+        Args:
+            rates: array of error rates
+            names: (Optional) list of names parallel to rates
+        """
+        rates = np.atleast_1d(np.asarray(rates, dtype=np.float64))
+        n_new = rates.shape[0]
+        if names is None:
+            names = [f"err_source{self.err_num + i}" for i in range(n_new)]
+            self.err_num += n_new
+        elif len(names) != n_new:
+            raise ValueError(
+                f"expected {n_new} names to match rates, got {len(names)}"
+            )
+        if len(set(names)) != n_new or not self._name_to_idx.keys().isdisjoint(names):
+            # duplicates, within the batch or against registered names,
+            # must upsert one at a time so rates are replaced instead of
+            # double-counted
+            for name, rate in zip(names, rates):
+                self.add_error_source(float(rate), name)
+            return
+        needed = self._n + n_new
+        if needed > self._rates.shape[0]:
+            capacity = self._rates.shape[0]
+            while capacity < needed:
+                capacity *= 2
+            self._rates = np.resize(self._rates, capacity)
+        self._rates[self._n : needed] = rates
+        self._names.extend(names)
+        for i, name in enumerate(names):
+            self._name_to_idx[name] = self._n + i
+        self._n = needed
+        self._dirty = True
+
+    def add_length_dependent_error(
+        self,
+        err_rate_per_meter,
+        name=None,
+        length=None,
+        _log1p=math.log1p,
+        _expm1=math.expm1,
+    ):
         """
         Adds an error source that is calculated based on the length of the link
         """
@@ -31,9 +103,56 @@ class ErrorCalculator:
             functional_len = self.length
         else:
             functional_len = length
-        total_err = 1 - math.pow(1 - err_rate_per_meter, functional_len)
+        # _log1p/_expm1 are pre-bound as defaults: LOAD_FAST instead of a
+        # global-plus-attribute lookup per call in segment loops
+        if err_rate_per_meter >= 1.0:
+            # certain loss per meter: log1p(-1) has no finite value, but
+            # any positive length loses everything; length 0 keeps the
+            # baseline pow(1 - r, 0) == 1, i.e. an error of 0
+            total_err = 1.0 if functional_len > 0 else 0.0
+        else:
+            total_err = -_expm1(functional_len * _log1p(-err_rate_per_meter))
         self.add_error_source(total_err, name)
 
+    def add_length_dependent_error_vec(self, err_rate_per_meter, lengths):
+        """
+        Vectorized companion to add_length_dependent_error: evaluates the
+        length-dependent error curve over an array of lengths in one NumPy
+        pass, without registering anything. Useful for characterizing a
+        whole fiber instead of calling the scalar version in a loop.
+
+        Returns:
+            ndarray of error rates, one per length
+        """
+        lengths = np.asarray(lengths, dtype=np.float64)
+        if err_rate_per_meter >= 1.0:
+            return np.where(lengths > 0.0, 1.0, 0.0)
+        return -np.expm1(lengths * math.log1p(-err_rate_per_meter))
+
+    def add_length_dependent_errors(self, rates_per_meter, lengths, name_prefix=None):
+        """
+        Batch form of add_length_dependent_error for many fiber segments:
+        computes -expm1(length * log1p(-rate)) over whole arrays in one
+        SIMD pass and registers each result as an error source.
+        Sources are named `{name_prefix}_{i}` when a prefix is given.
+        """
+        rates_per_meter, lengths = np.broadcast_arrays(
+            np.atleast_1d(np.asarray(rates_per_meter, dtype=np.float64)),
+            np.atleast_1d(np.asarray(lengths, dtype=np.float64)),
+        )
+        # certain-loss rates (>= 1) are masked out of the log1p: feeding
+        # them through gives -inf, and 0 * -inf turns a zero-length
+        # segment into nan. They saturate to 1, except at length 0 where
+        # the baseline pow(1 - r, 0) == 1 makes the error exactly 0.
+        saturated = rates_per_meter >= 1.0
+        safe_rates = np.where(saturated, 0.0, rates_per_meter)
+        total_errs = -np.expm1(lengths * np.log1p(-safe_rates))
+        total_errs = np.where(saturated & (lengths > 0.0), 1.0, total_errs)
+        names = None
+        if name_prefix:
+            names = [f"{name_prefix}_{i}" for i in range(total_errs.shape[0])]
+        self.add_error_sources(total_errs, names)
+
     def add_custom_error(self, error_function, *func_args, name=None, **func_kwargs):
         """
         Adds an error source calculated from a user supplied function.
@@ -43,6 +162,20 @@ class ErrorCalculator:
         calculated_error = error_function(*func_args, **func_kwargs)
         self.add_error_source(calculated_error, name)
 
+    def add_custom_error_vec(self, error_function, *func_args, name_prefix=None):
+        """
+        Batched companion to add_custom_error: evaluates error_function
+        across arrays of arguments in one np.vectorize pass and registers
+        one error source per result, instead of paying a Python-level
+        add_custom_error call for every point of a sweep.
+        Sources are named `{name_prefix}_{i}` when a prefix is given.
+        """
+        rates = np.atleast_1d(np.vectorize(error_function)(*func_args))
+        names = None
+        if name_prefix:
+            names = [f"{name_prefix}_{i}" for i in range(rates.shape[0])]
+        self.add_error_sources(rates, names)
+
     def add_custom_length_error(
         self, error_function, *func_args, name=None, **func_kwargs
     ):
@@ -52,18 +185,59 @@ class ErrorCalculator:
         parameters *func_args and **func_kwargs to the supplied function.
         error_function cannot take name as a keyword argument
         The first parameter of error_function must be the length.
+        Functions marked with @qkd_jittable (and called without keyword
+        arguments) are njit-compiled on first registration and the
+        compiled specialization is reused afterwards.
         """
-        total_err = error_function(self.length, *func_args, **func_kwargs)
+        if (
+            NUMBA_AVAILABLE
+            and not func_kwargs
+            and getattr(error_function, "__qkd_jittable__", False)
+        ):
+            compiled = self._jit_cache.get(error_function)
+            if compiled is None:
+                compiled = njit(fastmath=True)(error_function)
+                self._jit_cache[error_function] = compiled
+            total_err = compiled(self.length, *func_args)
+        else:
+            total_err = error_function(self.length, *func_args, **func_kwargs)
         self.add_error_source(total_err, name)
 
+    def get_error_rate(self, name):
+        """
+        Looks up a registered error source's rate by name.
+        """
+        return self._rates[self._name_to_idx[name]]
+
+    @staticmethod
+    def memoize_custom(error_function, maxsize=1024):
+        """
+        Wraps a user supplied error function with an LRU cache so repeated
+        calls with the same arguments (common in sweeps) skip recomputation.
+        The function's arguments must be hashable.
+        """
+        return lru_cache(maxsize=maxsize)(error_function)
+
+    def _refresh(self):
+        if self._dirty:
+            self._cached_total = total_error(self._rates[: self._n])
+            self._success = 1.0 - self._cached_total
+            # a certain-loss source drives success to 0; no finite bitrate
+            # can reach the target then
+            if self._success > 0.0:
+                self._inv_success = 1.0 / self._success
+            else:
+                self._inv_success = math.inf
+            self._dirty = False
+
     def calculate_total_error(self):
         """
         Collects all the errors stored in the object into one total error rate.
+        Computed as -expm1(sum(log1p(-rate))) over the packed rate buffer by
+        the compiled kernel, and cached until the next mutation.
         """
-        total_rate = 1.0
-        for err in self.err.values():
-            total_rate *= 1 - err
-        return 1 - total_rate
+        self._refresh()
+        return self._cached_total
 
     def adjust_bitrate(self, bitrate):
         """
@@ -75,22 +249,24 @@ class ErrorCalculator:
         Returns:
             Adjusted average bitrate = bitrate * (1-total_errors)
         """
-        total_err = self.calculate_total_error()
-        return bitrate * (1 - total_err)
+        self._refresh()
+        return bitrate * self._success
 
     def calculate_needed_bitrate(self, target_bitrate):
         """
         Like adjust_bitrate, but instead calculates the needed bitrate to
         successfully transmit at target_bitrate on average
         """
-        total_err = self.calculate_total_error()
-        return target_bitrate / (1 - total_err)
+        self._refresh()
+        return target_bitrate * self._inv_success
 
 
 def _test_code():
     _basic_error_test()
     _length_error_test()
+    _length_error_vec_test()
     _custom_error_test()
+    _custom_error_vec_test()
     _custom_length_error_test()
     _adjust_demo()
 
@@ -135,7 +311,17 @@ def _length_error_test():
     print()
 
 
+def _length_error_vec_test():
+    print("Testing vectorized length errors")
+    cal1 = ErrorCalculator(4)
+    errors = cal1.add_length_dependent_error_vec(0.5, [4, 10])
+    print(f"Expected errors: {15/16} {1023/1024}")
+    print(f"Actual errors: {errors[0]} {errors[1]}")
+    print()
+
+
 # Implementation of error function for BPSK modulation, in dB
+@lru_cache(maxsize=1024)
 def _snr_to_bit_err(ratio):
     # convert from db to real ratio
     # snr_db = 10log(Eb/N0)
@@ -149,10 +335,16 @@ def _snr_to_bit_err(ratio):
     return error_rate
 
 
+@lru_cache(maxsize=1024)
 def _simple_custom_error(length):
     return 1 / length
 
 
+@qkd_jittable
+def _jittable_custom_error(length):
+    return 1 / length
+
+
 def _custom_error_test():
     print("Testing Custom Errors")
     cal1 = ErrorCalculator(4)
@@ -163,6 +355,16 @@ def _custom_error_test():
     print()
 
 
+def _custom_error_vec_test():
+    print("Testing batched custom errors")
+    cal1 = ErrorCalculator(4)
+    cal1.add_custom_error_vec(_snr_to_bit_err, [10, 12], name_prefix="snr")
+    expected = 1 - (1 - _snr_to_bit_err(10)) * (1 - _snr_to_bit_err(12))
+    print(f"Expected error: {expected}")
+    print(f"Actual error: {cal1.calculate_total_error()}")
+    print()
+
+
 def _custom_length_error_test():
     print("Testing custom length errors")
     cal1 = ErrorCalculator(4)
@@ -173,6 +375,10 @@ def _custom_length_error_test():
     cal2.add_custom_length_error(_simple_custom_error)
     print(f"Expected error: {.1}")
     print(f"Actual error: {cal2.calculate_total_error()}")
+    cal3 = ErrorCalculator(4)
+    cal3.add_custom_length_error(_jittable_custom_error)
+    print(f"Expected jittable error: {.25}")
+    print(f"Actual jittable error: {cal3.calculate_total_error()}")
     print()
 
 
@@ -0,0 +1,125 @@
+"""
+Numba-compiled numeric kernels shared by the simulator and calculator.
+
+Numba is optional: when it is not installed the kernels fall back to the
+plain Python definitions, which NumPy arrays still support.
+"""
+
+import math
+
+try:
+    from numba import njit, prange
+
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+    prange = range
+
+    def njit(*args, **kwargs):
+        # Pass-through decorator so the kernels stay usable without numba.
+        if args and callable(args[0]):
+            return args[0]
+
+        def wrap(func):
+            return func
+
+        return wrap
+
+
+def qkd_jittable(error_function):
+    """
+    Marks a pure, numba-compatible error function as safe to specialize:
+    registration paths that receive a marked function compile it with
+    njit on first use and reuse the compiled version afterwards. With
+    numba absent the mark is inert and the plain function is called.
+    """
+    error_function.__qkd_jittable__ = True
+    return error_function
+
+
+def _total_error_impl(err_rates):
+    """
+    Combined error rate 1 - prod(1 - err) over a float64 array of rates.
+
+    Computed as -expm1(sum(log1p(-err))): the additive form avoids the
+    cancellation a chain of (1 - err) multiplies accumulates when many
+    small rates are present. A certain-loss rate (>= 1) saturates the
+    total to exactly 1.0; math.log1p has no finite value there and the
+    pure-Python fallback would raise a domain error.
+    """
+    log_survival = 0.0
+    for i in range(err_rates.shape[0]):
+        if err_rates[i] >= 1.0:
+            return 1.0
+        log_survival += math.log1p(-err_rates[i])
+    return -math.expm1(log_survival)
+
+
+def _run_kernel_impl(
+    log_survival, length, fiber_speed, send_fixed, send_per_qubit, recv_per_qubit, key_len
+):
+    """
+    Fused single-configuration run: qubits needed, total time, loss rate.
+
+    Takes the accumulated log-survival and the precomputed endpoint delay
+    coefficients so the whole pipeline runs without crossing back into
+    Python between stages.
+    """
+    survival = math.exp(log_survival)
+    # ceil(k / s) as -floor(-k / s): one floor-division, no libm ceil call
+    T = int(-(-key_len // survival))
+    prop_delay = length / fiber_speed
+    total_time = send_fixed + T * (send_per_qubit + recv_per_qubit) + 2.0 * prop_delay
+    return T, total_time, -math.expm1(log_survival)
+
+
+@njit(parallel=True, cache=True, fastmath=True)
+def run_sweep_kernel(
+    add_log_survival,
+    lengths,
+    len_errs,
+    fiber_speed,
+    send_fixed,
+    send_per_qubit,
+    recv_per_qubit,
+    key_lens,
+    out_qubits,
+    out_time,
+    out_loss,
+):
+    """
+    Evaluates a whole sweep of configurations into preallocated output
+    arrays, with the outer loop spread across CPU threads via prange.
+    Each iteration recomputes its own fiber term, so threads share no
+    mutable state. Configurations with zero survival are reported with
+    the run_batch sentinel: -1 qubits, infinite time, loss 1.0. Not part
+    of the AOT build: numba's pycc cannot compile the parallel target.
+    """
+    for i in prange(lengths.shape[0]):
+        log_survival = -len_errs[i] * lengths[i] + add_log_survival
+        survival = math.exp(log_survival)
+        if survival <= 0.0:
+            # zero survival would wrap the int cast to garbage
+            out_qubits[i] = -1
+            out_time[i] = math.inf
+            out_loss[i] = 1.0
+        else:
+            T = int(-(-key_lens[i] // survival))
+            prop_delay = lengths[i] / fiber_speed
+            out_qubits[i] = T
+            out_time[i] = (
+                send_fixed + T * (send_per_qubit + recv_per_qubit) + 2.0 * prop_delay
+            )
+            out_loss[i] = -math.expm1(log_survival)
+
+
+# Prefer the ahead-of-time build (see build_aot.py), which skips numba's
+# first-call JIT compilation in short-lived processes; fall back to JIT.
+try:
+    from qkd_native import run_kernel, total_error
+
+    AOT_AVAILABLE = True
+except ImportError:
+    AOT_AVAILABLE = False
+    total_error = njit(cache=True, fastmath=True)(_total_error_impl)
+    run_kernel = njit(cache=True, fastmath=True)(_run_kernel_impl)